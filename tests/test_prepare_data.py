@@ -0,0 +1,425 @@
+import hashlib
+import http.server
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+from unittest import mock
+
+import prepare_data
+
+
+class _Unseekable(io.RawIOBase):
+    """Write-only stream, so ZipFile falls back to data descriptors."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def _chunks(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+class _RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves ``server.payload`` under a strong ETag, honouring ``Range`` and
+    ``If-Range``. A GET is cut off after ``server.drops.pop(0)`` bytes while
+    that list isn't empty (``None`` sends the whole body). Ranges start
+    ``server.range_shift`` bytes off from the requested offset.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(self.server.head_etag or self.server.etag)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(dict(self.headers))
+            drop = self.server.drops.pop(0) if self.server.drops else None
+        self.respond(self.server.etag, drop)
+
+    def respond(self, etag, drop=None):
+        payload = self.server.payload
+        start, end, status = 0, len(payload) - 1, 200
+        byte_range = self.headers.get("Range")
+        if byte_range and self.headers.get("If-Range", etag) == etag:
+            lo, hi = byte_range[len("bytes="):].split("-")
+            start, end, status = int(lo), int(hi) if hi else len(payload) - 1, 206
+            start += self.server.range_shift
+        body = payload[start:end + 1]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+        self.end_headers()
+        if self.command == "GET":
+            try:
+                self.wfile.write(body if drop is None else body[:drop])
+            except ConnectionError:
+                pass  # the client gave up on the response
+
+
+class StreamUnzipTest(unittest.TestCase):
+
+    MEMBERS = {
+        "a/stored.txt": (b"stored " * 100, zipfile.ZIP_STORED),
+        "a/deflated.txt": (b"deflated " * 1000, zipfile.ZIP_DEFLATED),
+        "a/empty.txt": (b"", zipfile.ZIP_DEFLATED),
+        "b/c/nested.bin": (os.urandom(5000), zipfile.ZIP_DEFLATED),
+    }
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dest = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def build(self, fileobj, members, dirs_method=zipfile.ZIP_DEFLATED):
+        with zipfile.ZipFile(fileobj, "w") as zf:
+            zf.writestr(zipfile.ZipInfo("a/"), b"", compress_type=dirs_method)
+            zf.writestr(zipfile.ZipInfo("empty_dir/"), b"", compress_type=dirs_method)
+            for name, (data, method) in members.items():
+                zf.writestr(name, data, compress_type=method)
+
+    def assertExtracted(self, members):
+        self.assertTrue(os.path.isdir(os.path.join(self.dest, "empty_dir")))
+        for name, (data, _) in members.items():
+            with open(os.path.join(self.dest, name), "rb") as f:
+                self.assertEqual(f.read(), data, name)
+
+    def test_stored_deflated_and_directory_entries(self):
+        for dirs_method in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            buffer = io.BytesIO()
+            self.build(buffer, self.MEMBERS, dirs_method)
+            for chunk_size in (1, 7, 1 << 20):
+                prepare_data._stream_unzip(_chunks(buffer.getvalue(), chunk_size), self.dest)
+                self.assertExtracted(self.MEMBERS)
+
+    def test_data_descriptor_entries(self):
+        members = {name: (data, zipfile.ZIP_DEFLATED) for name, (data, _) in self.MEMBERS.items()}
+        # Stored directory entries are empty, so they stream despite their descriptor
+        for dirs_method in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            stream = _Unseekable()
+            self.build(stream, members, dirs_method)
+            data = stream.buffer.getvalue()
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                self.assertTrue(all(info.flag_bits & 0x8 for info in zf.infolist()))
+            for chunk_size in (3, 1 << 20):
+                prepare_data._stream_unzip(_chunks(data, chunk_size), self.dest)
+                self.assertExtracted(members)
+
+    def test_digest_covers_central_directory(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(300):
+                zf.writestr(f"images/{i:04d}.png", os.urandom(64))
+        data = buffer.getvalue()
+        with zipfile.ZipFile(buffer) as zf:
+            central_directory = len(data) - zf.start_dir
+        self.assertGreater(central_directory, 10 * 1024)
+        sha256 = hashlib.sha256()
+        prepare_data._stream_unzip(prepare_data._hashed_chunks(_chunks(data, 1024), sha256), self.dest)
+        self.assertEqual(sha256.hexdigest(), hashlib.sha256(data).hexdigest())
+
+    def test_pipelined_extract_digest(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(300):
+                zf.writestr(f"images/{i:04d}.png", os.urandom(64))
+        data = buffer.getvalue()
+
+        def download(f):
+            for chunk in _chunks(data, 1024):
+                f.write(chunk)
+
+        digest = prepare_data._pipelined_extract(download, self.dest)
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(len(os.listdir(os.path.join(self.dest, "images"))), 300)
+
+    def test_unsupported_archive_is_extracted_from_disk(self):
+        # ZipFile writes stored entries to an unseekable stream with a data
+        # descriptor, which can't be streamed since their size isn't known
+        stream = _Unseekable()
+        self.build(stream, self.MEMBERS)
+        data = stream.buffer.getvalue()
+        with self.assertRaises(prepare_data._UnsupportedZip):
+            prepare_data._stream_unzip(_chunks(data, 1024), self.dest)
+
+        def download(path):
+            with open(path, "wb") as f:
+                f.write(data)
+            return hashlib.sha256(data).hexdigest()
+
+        zip_path = os.path.join(self.dest, "datasets.zip")
+        with mock.patch.object(prepare_data, "_sha256sum") as sha256sum:
+            digest = prepare_data._extract_download(
+                lambda dest: prepare_data._pipelined_extract(lambda f: f.write(data), dest),
+                download, zip_path, self.dest)
+        # The digest computed by the download is used instead of a second pass
+        sha256sum.assert_not_called()
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        self.assertFalse(os.path.exists(zip_path))
+        self.assertExtracted(self.MEMBERS)
+
+    def test_parallel_extract(self):
+        zip_path = os.path.join(self.dest, "datasets.zip")
+        self.build(zip_path, self.MEMBERS)
+        for verified in (False, True):
+            prepare_data._parallel_extract(zip_path, self.dest, max_workers=4, verified=verified)
+            self.assertExtracted(self.MEMBERS)
+
+    def test_parallel_extract_checks_crc(self):
+        zip_path = os.path.join(self.dest, "datasets.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("file.txt", b"original contents")
+        with open(zip_path, "rb") as f:
+            data = f.read()
+        with open(zip_path, "wb") as f:
+            f.write(data.replace(b"original", b"tampered"))
+        with self.assertRaises(zipfile.BadZipFile):
+            prepare_data._parallel_extract(zip_path, self.dest)
+
+    def test_large_entry_is_inflated_inline(self):
+        # A highly compressible entry is inflated inline as well, since the
+        # pool would hold it in memory in one piece
+        members = {"big.bin": os.urandom(1 << 16), "zeros.bin": bytes(1 << 16), "small.bin": os.urandom(512)}
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        with mock.patch.object(prepare_data, "_POOL_INFLATE_LIMIT", 1024), \
+                mock.patch.object(prepare_data, "_POOL_PENDING_LIMIT", 0), \
+                mock.patch.object(prepare_data, "_inflate_member", wraps=prepare_data._inflate_member) as inflate:
+            prepare_data._stream_unzip(_chunks(buffer.getvalue(), 4096), self.dest)
+        self.assertEqual([call.args[0] for call in inflate.call_args_list], ["small.bin"])
+        for name, data in members.items():
+            with open(os.path.join(self.dest, name), "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def test_corrupt_entry_is_rejected(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("file.txt", b"original contents")
+        data = buffer.getvalue().replace(b"original", b"tampered")
+        with self.assertRaises(zipfile.BadZipFile):
+            prepare_data._stream_unzip(_chunks(data, 16), self.dest)
+
+    def test_truncated_archive_is_rejected(self):
+        buffer = io.BytesIO()
+        self.build(buffer, self.MEMBERS)
+        data = buffer.getvalue()
+        with self.assertRaises(zipfile.BadZipFile):
+            prepare_data._stream_unzip(_chunks(data[:len(data) // 2], 64), self.dest)
+
+    def test_non_zip_stream_is_rejected(self):
+        with self.assertRaises(zipfile.BadZipFile):
+            prepare_data._stream_unzip([b"<html>virus scan warning</html>"], self.dest)
+
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+        self.server.payload = os.urandom(3 << 20)
+        self.server.etag = '"v1"'
+        self.server.head_etag = None
+        self.server.drops = []
+        self.server.range_shift = 0
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/file.bin"
+        self.digest = hashlib.sha256(self.server.payload).hexdigest()
+        for patcher in (mock.patch.object(prepare_data, "log"),
+                        mock.patch.object(prepare_data.time, "sleep")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._tmp.cleanup()
+
+    def assertDownloaded(self, path):
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.server.payload)
+        self.assertEqual(os.listdir(self.dir), [os.path.basename(path)])
+
+    def test_resume_after_dropped_connection(self):
+        self.server.drops = [1 << 20]
+        path = os.path.join(self.dir, "file.bin")
+        self.assertEqual(prepare_data._resumable_download(self.url, path), self.digest)
+        self.assertDownloaded(path)
+        first, resumed = self.server.requests
+        self.assertNotIn("Range", first)
+        self.assertTrue(resumed["Range"].startswith("bytes=") and resumed["Range"] != "bytes=0-")
+        self.assertEqual(resumed["If-Range"], '"v1"')
+        self.assertEqual({r["Accept-Encoding"] for r in self.server.requests}, {"identity"})
+
+    def test_stale_validator_restarts_download(self):
+        path = os.path.join(self.dir, "file.bin")
+        with open(path + ".part", "wb") as f:
+            f.write(b"stale bytes")
+        with open(path + ".meta.json", "w") as f:
+            json.dump({"url": self.url, "validator": '"v0"'}, f)
+        self.assertEqual(prepare_data._resumable_download(self.url, path), self.digest)
+        self.assertDownloaded(path)
+        self.assertEqual(self.server.requests[0]["If-Range"], '"v0"')
+
+    def test_disk_errors_are_not_retried(self):
+        path = os.path.join(self.dir, "missing", "file.bin")
+        with self.assertRaises(FileNotFoundError):
+            prepare_data._resumable_download(self.url, path)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+    def test_segment_resumes_after_dropped_connection(self):
+        # Segments span several 1 MiB reads, so the cut one has progress to resume from
+        self.server.payload = os.urandom(12 << 20)
+        self.server.drops = [(3 << 20) // 2]
+        path = os.path.join(self.dir, "file.bin")
+        fallback = mock.Mock()
+        prepare_data._segmented_download(self.url, path, fallback=fallback)
+        fallback.assert_not_called()
+        self.assertDownloaded(path)
+        size = len(self.server.payload)
+        starts = {(i * size // 4) for i in range(4)}
+        ranges = [r["Range"] for r in self.server.requests]
+        self.assertEqual(len(ranges), 5)
+        resumed = [r for r in ranges if int(r[len("bytes="):].split("-")[0]) not in starts]
+        self.assertEqual(len(resumed), 1)
+
+    def test_changed_file_falls_back_to_single_stream(self):
+        self.server.head_etag = '"v0"'
+        path = os.path.join(self.dir, "file.bin")
+        self.assertEqual(prepare_data._segmented_download(self.url, path), self.digest)
+        self.assertDownloaded(path)
+
+    def test_stale_part_is_removed_for_non_resuming_fallback(self):
+        path = os.path.join(self.dir, "file.bin")
+        with open(path + ".part", "wb") as f:
+            f.write(b"\0" * 1024)
+
+        def fallback(url, dest):
+            with open(dest, "wb") as f:
+                f.write(self.server.payload)
+
+        prepare_data._segmented_download(self.url, path, fallback=fallback)
+        self.assertDownloaded(path)
+
+
+    def test_cache_hit_skips_download(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(prepare_data, "_CACHE_DIR", cache_dir):
+            path = os.path.join(self.dir, "file.bin")
+            prepare_data._cached_download(self.url, path, self.digest)
+            self.assertDownloaded(path)
+            os.remove(path)
+
+            downloader = mock.Mock()
+            prepare_data._cached_download(self.url, path, self.digest, downloader=downloader)
+            downloader.assert_not_called()
+            self.assertDownloaded(path)
+            self.assertEqual(len(self.server.requests), 1)
+
+    def test_cache_rejects_checksum_mismatch(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(prepare_data, "_CACHE_DIR", cache_dir):
+            path = os.path.join(self.dir, "file.bin")
+            with self.assertRaises(IOError):
+                prepare_data._cached_download(self.url, path, "0" * 64)
+            self.assertEqual(os.listdir(self.dir), [])
+            entries = [files for _, _, files in os.walk(cache_dir)]
+            self.assertEqual(sum(entries, []), [])
+
+
+    def test_stream_resumes_after_dropped_connection(self):
+        self.server.drops = [(3 << 20) // 2]
+        with prepare_data._SESSION.get(self.url, stream=True) as response:
+            data = b"".join(prepare_data._resumable_chunks(response))
+        self.assertEqual(data, self.server.payload)
+        self.assertEqual(self.server.requests[1]["Range"], f"bytes={1 << 20}-")
+
+    def test_stream_rejects_misplaced_range(self):
+        self.server.drops = [(3 << 20) // 2]
+        # Resumes one byte early, so the body still adds up to the full length
+        self.server.range_shift = -1
+        with prepare_data._SESSION.get(self.url, stream=True) as response:
+            with self.assertRaises(IOError):
+                b"".join(prepare_data._resumable_chunks(response))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_stream_rejects_changed_file(self):
+        self.server.drops = [(3 << 20) // 2]
+        with prepare_data._SESSION.get(self.url, stream=True) as response:
+            chunks = prepare_data._resumable_chunks(response)
+            next(chunks)
+            self.server.etag = '"v2"'
+            with self.assertRaises(IOError):
+                b"".join(chunks)
+
+
+
+class DatasetsFolderTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_is_extracted(self):
+        self.assertFalse(prepare_data._is_extracted(self.dir, "file-id"))
+        with open(os.path.join(self.dir, prepare_data._EXTRACTED_MARKER), "w") as f:
+            f.write("{truncated")
+        self.assertFalse(prepare_data._is_extracted(self.dir, "file-id"))
+
+        prepare_data._mark_extracted(self.dir, "file-id", "a" * 64)
+        self.assertTrue(prepare_data._is_extracted(self.dir, "file-id"))
+        self.assertFalse(prepare_data._is_extracted(self.dir, "other-id"))
+        with mock.patch.dict(prepare_data.EXPECTED_SHA256, {"file-id": "a" * 64}):
+            self.assertTrue(prepare_data._is_extracted(self.dir, "file-id"))
+        with mock.patch.dict(prepare_data.EXPECTED_SHA256, {"file-id": "b" * 64}):
+            self.assertFalse(prepare_data._is_extracted(self.dir, "file-id"))
+
+
+    def test_parallel_rmtree(self):
+        outside = os.path.join(self.dir, "outside")
+        os.makedirs(outside)
+        with open(os.path.join(outside, "keep.txt"), "w") as f:
+            f.write("keep")
+        root = os.path.join(self.dir, "datasets")
+        for sub in ("Covid19/Train/img", "Covid19/Test", "MosMedPlus"):
+            os.makedirs(os.path.join(root, sub))
+            with open(os.path.join(root, sub, "file.png"), "wb") as f:
+                f.write(b"png")
+        with open(os.path.join(root, "top.txt"), "w") as f:
+            f.write("top")
+        os.symlink(outside, os.path.join(root, "Covid19", "link"))
+
+        prepare_data._parallel_rmtree(root)
+        self.assertFalse(os.path.exists(root))
+        # Symlinked directories are unlinked, not followed
+        self.assertEqual(os.listdir(outside), ["keep.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()